@@ -1,8 +1,11 @@
 import streamlit as st
+import hashlib
 import json
 import os
+import threading
+import tracemalloc
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Frame, PageTemplate
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT
 
@@ -32,10 +35,9 @@ def save_templates(data):
         json.dump(data, f, indent=4)
 
 def resolve_json_path(data, path):
-    """Fetch value from JSON using path like: user → payDetail → total_salary_amount"""
+    """Fetch value from JSON using a compiled path like: ["user", "payDetail", "total_salary_amount"]"""
     try:
-        parts = [p.strip() for p in path.split("→")]
-        for p in parts:
+        for p in path:
             data = data[p]
         return data
     except:
@@ -44,39 +46,178 @@ def resolve_json_path(data, path):
 def alignment_to_enum(align):
     return {"Left": TA_LEFT, "Center": TA_CENTER, "Right": TA_RIGHT}[align]
 
+# -------------------------------------
+# TEMPLATE COMPILATION
+# -------------------------------------
+
+COMPILED_VERSION = 2
+ALIGNMENTS = ["Left", "Center", "Right"]
+
+DUMMY_DATA = {
+    "user": {
+        "name": "Amit Sharma",
+        "payDetail": {
+            "total_salary_amount": "75,000 INR",
+            "hra": "10,000 INR"
+        }
+    },
+    "bill": {
+        "bill_no": "BILL-2025-009",
+        "amount": "12,500 INR"
+    }
+}
+
+def compile_field(item):
+    """Normalize one template field: split mapping path, alignment as enum"""
+    align = item.get("align", "Left")
+    return {
+        "key": item["key"],
+        "path": [p.strip() for p in item["map"].split("→")],
+        "default": item["default"],
+        "align": alignment_to_enum(align if align in ALIGNMENTS else "Left")
+    }
+
+def section_fingerprint(fields):
+    """sha1 of a section's source fields, stored next to the compiled form so
+    hand-edited or externally updated templates are recompiled"""
+    h = hashlib.sha1()
+    for item in fields:
+        h.update(json.dumps(item, sort_keys=True).encode())
+    return h.hexdigest()
+
+def compile_template(template, sample=None):
+    """Validate a template and precompute the field list used by generate_pdf.
+    Returns (compiled, errors, warnings); errors block saving, paths missing
+    from the sample are only warnings because missing values fall back to the default."""
+    compiled = {"version": COMPILED_VERSION, "source": {}}
+    errors = []
+    warnings = []
+
+    for section in ["Header", "Body", "Footer"]:
+        fields = []
+        for i, item in enumerate(template.get(section, [])):
+            field = compile_field(item)
+            align = item.get("align", "Left")
+
+            if align not in ALIGNMENTS:
+                errors.append(f"{section} field {i+1}: unknown alignment '{align}'")
+            if item["map"].strip() and not all(field["path"]):
+                errors.append(f"{section} field {i+1}: malformed mapping '{item['map']}'")
+            elif sample is not None and item["map"].strip() and resolve_json_path(sample, field["path"]) is None:
+                warnings.append(f"{section} field {i+1}: '{item['map']}' not in sample data, default '{item['default']}' will be used")
+
+            fields.append(field)
+        compiled[section] = fields
+        compiled["source"][section] = section_fingerprint(template.get(section, []))
+
+    return compiled, errors, warnings
+
+def iter_fields(template, section):
+    """Yield the compiled fields of a section. Templates saved by older versions,
+    or whose source fields changed since saving, are compiled one field at a
+    time instead of building the whole list."""
+    compiled = template.get("compiled")
+    if (compiled and compiled.get("version") == COMPILED_VERSION
+            and compiled["source"].get(section) == section_fingerprint(template.get(section, []))):
+        yield from compiled[section]
+    else:
+        for item in template.get(section, []):
+            yield compile_field(item)
+
 # -------------------------------------
 # PDF GENERATION
 # -------------------------------------
 
-def generate_pdf(template, user_json=None):
-    filename = "generated_output.pdf"
-    doc = SimpleDocTemplate(filename, pagesize=A4)
-    story = []
+STREAM_LOOKAHEAD = 16
+
+def iter_story(template, user_json=None):
+    """Yield the PDF flowables one at a time"""
     styles = getSampleStyleSheet()
+    field_styles = {}
 
     for section in ["Header", "Body", "Footer"]:
-        story.append(Paragraph(f"<b>{section}</b>", styles["Heading3"]))
+        yield Paragraph(f"<b>{section}</b>", styles["Heading3"])
 
-        for item in template.get(section, []):
+        for item in iter_fields(template, section):
             key = item["key"]
-            path = item["map"]
-            default = item["default"]
-            align = item["align"]
 
-            value = resolve_json_path(user_json or {}, path)
+            value = resolve_json_path(user_json or {}, item["path"])
             if value is None:
-                value = default
-
-            style = ParagraphStyle(
-                name="custom_align",
-                alignment=alignment_to_enum(align),
-                fontSize=12
-            )
+                value = item["default"]
+
+            if item["align"] not in field_styles:
+                field_styles[item["align"]] = ParagraphStyle(
+                    name="custom_align",
+                    alignment=item["align"],
+                    fontSize=12
+                )
+
+            yield Paragraph(f"{key}: {value}", field_styles[item["align"]])
+            yield Spacer(1, 6)
+
+def build_streaming(doc, flowables):
+    """Lay out flowables pulled from an iterator, keeping only a small window
+    of the story alive. Mirrors SimpleDocTemplate.build / BaseDocTemplate.build
+    through reportlab's private _startBuild / handle_flowable / _endBuild API
+    (checked against reportlab 5.0.1). Finished pages stay in memory as
+    compressed page streams until save, so memory still grows slowly with
+    page count."""
+    doc._calc()
+    frame = Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height, id="normal")
+    doc.addPageTemplates([
+        PageTemplate(id="First", frames=frame, pagesize=doc.pagesize),
+        PageTemplate(id="Later", frames=frame, pagesize=doc.pagesize)
+    ])
+    doc._startBuild()
+    canv = doc.canv
 
-            story.append(Paragraph(f"{key}: {value}", style))
-            story.append(Spacer(1, 6))
+    try:
+        canv._doctemplate = doc
+        # keep a few flowables queued so keepWithNext / split parts still work
+        window = []
+        for flowable in flowables:
+            window.append(flowable)
+            while len(window) > STREAM_LOOKAHEAD:
+                doc.clean_hanging()
+                doc.handle_flowable(window)
+        while window:
+            doc.clean_hanging()
+            doc.handle_flowable(window)
+    finally:
+        del canv._doctemplate
+
+    doc._endBuild()
+
+@st.cache_resource
+def memory_trace_lock():
+    return threading.Lock()
+
+def traced_generate_pdf(*args, **kwargs):
+    """Run generate_pdf under tracemalloc and return (filename, peak MB of
+    Python memory allocated during the call). tracemalloc is process-wide, so
+    measured generations are serialized; unmeasured sessions running at the
+    same time are still counted."""
+    with memory_trace_lock():
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        try:
+            filename = generate_pdf(*args, **kwargs)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            if started:
+                tracemalloc.stop()
+    return filename, peak / (1024 * 1024)
+
+def generate_pdf(template, user_json=None, stream=False):
+    filename = "generated_output.pdf"
+    doc = SimpleDocTemplate(filename, pagesize=A4)
 
-    doc.build(story)
+    if stream:
+        build_streaming(doc, iter_story(template, user_json))
+    else:
+        doc.build(list(iter_story(template, user_json)))
     return filename
 
 # -------------------------------------
@@ -149,13 +290,21 @@ if menu == "Create Template":
 
         # Save Template Button
         if st.button("Save Template"):
-            templates[template_name] = {
+            template = {
                 "Header": header,
                 "Body": body,
                 "Footer": footer
             }
-            save_templates(templates)
-            st.success("Template saved successfully!")
+            compiled, errors, warnings = compile_template(template, DUMMY_DATA)
+            if errors:
+                st.error("Template not saved:\n\n" + "\n\n".join(errors))
+            else:
+                template["compiled"] = compiled
+                templates[template_name] = template
+                save_templates(templates)
+                st.success("Template saved successfully!")
+                if warnings:
+                    st.warning("Saved, but some mappings were not found in the sample data:\n\n" + "\n\n".join(warnings))
 
 # -------------------------------------
 # 2. PDF PREVIEW / GENERATION SCREEN
@@ -170,21 +319,6 @@ if menu == "Preview & Generate PDF":
         template_name = st.selectbox("Select Template", list(templates.keys()))
         template = templates[template_name]
 
-        # Dummy Data
-        dummy_data = {
-            "user": {
-                "name": "Amit Sharma",
-                "payDetail": {
-                    "total_salary_amount": "75,000 INR",
-                    "hra": "10,000 INR"
-                }
-            },
-            "bill": {
-                "bill_no": "BILL-2025-009",
-                "amount": "12,500 INR"
-            }
-        }
-
         user_json = None
 
         # Salary Template check
@@ -192,11 +326,19 @@ if menu == "Preview & Generate PDF":
             st.subheader("Select User")
             users = ["Amit Sharma", "Ravi Kumar", "Priya Nair"]
             selected = st.selectbox("User", users)
-            user_json = dummy_data  # same for demo
+            user_json = DUMMY_DATA  # same for demo
+
+        stream = st.checkbox("Streaming mode (lower memory for very long documents)")
+        measure = st.checkbox("Measure peak memory of this generation (slower)")
 
         if st.button("Generate PDF"):
-            file = generate_pdf(template, user_json)
+            if measure:
+                file, peak = traced_generate_pdf(template, user_json, stream=stream)
+            else:
+                file = generate_pdf(template, user_json, stream=stream)
             st.success("PDF Generated!")
+            if measure:
+                st.caption(f"Peak Python memory during generation: {peak:.1f} MB")
 
             with open(file, "rb") as f:
                 st.download_button("Download PDF", f, file_name="output.pdf")
@@ -1,7 +1,10 @@
 import streamlit as st
+import hashlib
 import json
 import os
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+import threading
+import tracemalloc
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Frame, PageTemplate
 from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT
 from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.lib.pagesizes import A4
@@ -33,8 +36,7 @@ def save_templates(data):
 # ---------------------------
 def resolve_json_path(data, path):
     try:
-        parts = [p.strip() for p in path.split("→")]
-        for p in parts:
+        for p in path:
             data = data[p]
         return data
     except:
@@ -43,35 +45,156 @@ def resolve_json_path(data, path):
 def alignment_to_enum(al):
     return {"Left": TA_LEFT, "Center": TA_CENTER, "Right": TA_RIGHT}[al]
 
+# ---------------------------
+# TEMPLATE COMPILATION
+# ---------------------------
+COMPILED_VERSION = 2
+ALIGNMENTS = ["Left", "Center", "Right"]
+
+DUMMY = {
+    "user": {
+        "name": "Amit Sharma",
+        "company": {"name": "ABC Pvt Ltd"},
+        "payDetail": {"total_salary_amount": "75,000", "hra": "10,000"}
+    },
+    "bill": {"bill_no": "INV-9001", "amount": "12,000 INR", "date": "01-12-2025"}
+}
+
+def compile_field(item):
+    align = item.get("align", "Left")
+    return {"key": item["key"], "path": [p.strip() for p in item["map"].split("→")],
+            "default": item["default"], "align": alignment_to_enum(align if align in ALIGNMENTS else "Left")}
+
+def section_fingerprint(fields):
+    """sha1 of a section's source fields, stored next to the compiled form so
+    hand-edited or externally updated templates are recompiled"""
+    h = hashlib.sha1()
+    for item in fields:
+        h.update(json.dumps(item, sort_keys=True).encode())
+    return h.hexdigest()
+
+def compile_template(template, sample=None):
+    """Validate fields and precompute paths/alignments. Returns (compiled, errors, warnings)."""
+    compiled = {"version": COMPILED_VERSION, "source": {}}
+    errors = []
+    warnings = []
+    for section in ["Header", "Body", "Footer"]:
+        fields = []
+        for i, item in enumerate(template[section]):
+            field = compile_field(item)
+            align = item.get("align", "Left")
+            if align not in ALIGNMENTS:
+                errors.append(f"{section} field {i+1}: unknown alignment '{align}'")
+            if item["map"].strip() and not all(field["path"]):
+                errors.append(f"{section} field {i+1}: malformed mapping '{item['map']}'")
+            elif sample is not None and item["map"].strip() and resolve_json_path(sample, field["path"]) is None:
+                warnings.append(f"{section} field {i+1}: '{item['map']}' not in sample data, default '{item['default']}' will be used")
+            fields.append(field)
+        compiled[section] = fields
+        compiled["source"][section] = section_fingerprint(template[section])
+    return compiled, errors, warnings
+
+def iter_fields(template, section):
+    """Stored compiled fields, or compile one field at a time when the stored
+    form is from an older version or the source fields changed since saving."""
+    compiled = template.get("compiled")
+    if (compiled and compiled.get("version") == COMPILED_VERSION
+            and compiled["source"].get(section) == section_fingerprint(template[section])):
+        yield from compiled[section]
+    else:
+        for item in template[section]:
+            yield compile_field(item)
+
 # ---------------------------
 # PDF: PROFESSIONAL LAYOUT
 # ---------------------------
-def generate_pdf(template, user_json=None):
-    file = "generated_output.pdf"
-    doc = SimpleDocTemplate(file, pagesize=A4)
-    story = []
+STREAM_LOOKAHEAD = 16
+
+def iter_story(template, user_json=None):
     styles = getSampleStyleSheet()
     header_style = ParagraphStyle("header", alignment=TA_CENTER, fontSize=18, spaceAfter=15, leading=22)
+    value_styles = {al: ParagraphStyle("val", alignment=al, fontSize=12) for al in (TA_LEFT, TA_CENTER, TA_RIGHT)}
 
-    story.append(Paragraph(f"<b>{template['name']}</b>", header_style))
-    story.append(Spacer(1, 10))
+    yield Paragraph(f"<b>{template['name']}</b>", header_style)
+    yield Spacer(1, 10)
 
     for section in ["Header", "Body", "Footer"]:
-        story.append(Paragraph(f"<b>---------------------<br/>{section.upper()} SECTION<br/>---------------------</b>",
-                               styles["Heading4"]))
-        story.append(Spacer(1, 8))
+        yield Paragraph(f"<b>---------------------<br/>{section.upper()} SECTION<br/>---------------------</b>",
+                        styles["Heading4"])
+        yield Spacer(1, 8)
 
-        for item in template[section]:
-            key, path, default, align = item["key"], item["map"], item["default"], item["align"]
+        for item in iter_fields(template, section):
+            key, path, default, align = item["key"], item["path"], item["default"], item["align"]
             value = resolve_json_path(user_json or {}, path) or default
 
-            pstyle = ParagraphStyle("val", alignment=alignment_to_enum(align), fontSize=12)
-            story.append(Paragraph(f"<b>{key}</b>: {value}", pstyle))
-            story.append(Spacer(1, 4))
+            yield Paragraph(f"<b>{key}</b>: {value}", value_styles[align])
+            yield Spacer(1, 4)
+
+        yield Spacer(1, 8)
+
+def build_streaming(doc, flowables):
+    """Lay out flowables pulled from an iterator, keeping only a small window
+    of the story alive. Mirrors SimpleDocTemplate.build / BaseDocTemplate.build
+    through reportlab's private _startBuild / handle_flowable / _endBuild API
+    (checked against reportlab 5.0.1). Finished pages stay in memory as
+    compressed page streams until save, so memory still grows slowly with
+    page count."""
+    doc._calc()
+    frame = Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height, id="normal")
+    doc.addPageTemplates([
+        PageTemplate(id="First", frames=frame, pagesize=doc.pagesize),
+        PageTemplate(id="Later", frames=frame, pagesize=doc.pagesize)
+    ])
+    doc._startBuild()
+    canv = doc.canv
+
+    try:
+        canv._doctemplate = doc
+        # keep a few flowables queued so keepWithNext / split parts still work
+        window = []
+        for flowable in flowables:
+            window.append(flowable)
+            while len(window) > STREAM_LOOKAHEAD:
+                doc.clean_hanging()
+                doc.handle_flowable(window)
+        while window:
+            doc.clean_hanging()
+            doc.handle_flowable(window)
+    finally:
+        del canv._doctemplate
+
+    doc._endBuild()
+
+@st.cache_resource
+def memory_trace_lock():
+    return threading.Lock()
 
-        story.append(Spacer(1, 8))
+def traced_generate_pdf(*args, **kwargs):
+    """Run generate_pdf under tracemalloc and return (filename, peak MB of
+    Python memory allocated during the call). tracemalloc is process-wide, so
+    measured generations are serialized; unmeasured sessions running at the
+    same time are still counted."""
+    with memory_trace_lock():
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        try:
+            filename = generate_pdf(*args, **kwargs)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            if started:
+                tracemalloc.stop()
+    return filename, peak / (1024 * 1024)
+
+def generate_pdf(template, user_json=None, stream=False):
+    file = "generated_output.pdf"
+    doc = SimpleDocTemplate(file, pagesize=A4)
 
-    doc.build(story)
+    if stream:
+        build_streaming(doc, iter_story(template, user_json))
+    else:
+        doc.build(list(iter_story(template, user_json)))
     return file
 
 # ---------------------------
@@ -117,14 +240,22 @@ if menu == "Create Template":
             f["align"] = st.selectbox(f"Footer Align {i}", ["Left","Center","Right"], index=["Left","Center","Right"].index(f["align"]))
 
         if st.button("Save Template"):
-            templates[name] = {
+            template = {
                 "name": name,
                 "Header": st.session_state.get("hdr", []),
                 "Body": st.session_state.get("bdy", []),
                 "Footer": st.session_state.get("ftr", [])
             }
-            save_templates(templates)
-            st.success("Template saved!")
+            compiled, errors, warnings = compile_template(template, DUMMY)
+            if errors:
+                st.error("Template not saved:\n\n" + "\n\n".join(errors))
+            else:
+                template["compiled"] = compiled
+                templates[name] = template
+                save_templates(templates)
+                st.success("Template saved!")
+                if warnings:
+                    st.warning("Saved, but some mappings were not found in the sample data:\n\n" + "\n\n".join(warnings))
 
 # ---------------------------
 # GENERATE PDF
@@ -138,22 +269,20 @@ if menu == "Preview & Generate PDF":
         tname = st.selectbox("Select Template", list(templates.keys()))
         template = templates[tname]
 
-        dummy = {
-            "user": {
-                "name": "Amit Sharma",
-                "company": {"name": "ABC Pvt Ltd"},
-                "payDetail": {"total_salary_amount": "75,000", "hra": "10,000"}
-            },
-            "bill": {"bill_no": "INV-9001", "amount": "12,000 INR", "date": "01-12-2025"}
-        }
-
-        user_json = dummy
+        user_json = DUMMY
 
         if "salary" in tname.lower():
             user = st.selectbox("Select User", ["Amit Sharma", "Ravi Kumar", "Priya"])
-            user_json = dummy
+            user_json = DUMMY
+
+        stream = st.checkbox("Streaming mode (lower memory for very long documents)")
+        measure = st.checkbox("Measure peak memory of this generation (slower)")
 
         if st.button("Generate PDF"):
-            file = generate_pdf(template, user_json)
+            if measure:
+                file, peak = traced_generate_pdf(template, user_json, stream=stream)
+                st.caption(f"Peak Python memory during generation: {peak:.1f} MB")
+            else:
+                file = generate_pdf(template, user_json, stream=stream)
             with open(file, "rb") as f:
                 st.download_button("Download PDF", f, file_name="professional.pdf")
@@ -1,7 +1,10 @@
 import streamlit as st
+import hashlib
 import json
 import os
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+import threading
+import tracemalloc
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Frame, PageTemplate
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet
@@ -27,32 +30,65 @@ def save_templates(data):
 
 def resolve_json_path(data, path):
     try:
-        for part in [p.strip() for p in path.split("→")]:
+        for part in path:
             data = data[part]
         return data
     except:
         return None
 
-def generate_pdf(template, user_json=None):
-    file = "generated_table.pdf"
-    doc = SimpleDocTemplate(file, pagesize=A4)
-    story = []
-    styles = getSampleStyleSheet()
+COMPILED_VERSION = 2
 
-    story.append(Paragraph(f"<b>{template['name']}</b>", styles["Heading1"]))
-    story.append(Spacer(1, 10))
+DUMMY = {
+    "user": {"name":"Amit","payDetail":{"total_salary_amount":"80,000"}},
+    "bill": {"bill_no":"BILL-1002","amount":"15,000 INR","date":"01-01-2025"}
+}
 
-    for section in ["Header", "Body", "Footer"]:
-        story.append(Paragraph(f"<b>{section}</b>", styles["Heading3"]))
-        story.append(Spacer(1, 6))
+def compile_field(item):
+    return {"key": item["key"], "path": [p.strip() for p in item["map"].split("→")], "default": item["default"]}
 
-        table_data = [["Key", "Value"]]
+def section_fingerprint(fields):
+    """sha1 of a section's source fields, stored next to the compiled form so
+    hand-edited or externally updated templates are recompiled"""
+    h = hashlib.sha1()
+    for item in fields:
+        h.update(json.dumps(item, sort_keys=True).encode())
+    return h.hexdigest()
 
+def compile_template(template, sample=None):
+    """Validate mapping paths and precompute them. Returns (compiled, errors, warnings)."""
+    compiled = {"version": COMPILED_VERSION, "source": {}}
+    errors = []
+    warnings = []
+    for section in ["Header", "Body", "Footer"]:
+        fields = []
+        for i, item in enumerate(template[section]):
+            field = compile_field(item)
+            if item["map"].strip() and not all(field["path"]):
+                errors.append(f"{section} field {i+1}: malformed mapping '{item['map']}'")
+            elif sample is not None and item["map"].strip() and resolve_json_path(sample, field["path"]) is None:
+                warnings.append(f"{section} field {i+1}: '{item['map']}' not in sample data, default '{item['default']}' will be used")
+            fields.append(field)
+        compiled[section] = fields
+        compiled["source"][section] = section_fingerprint(template[section])
+    return compiled, errors, warnings
+
+def iter_fields(template, section):
+    """Stored compiled fields, or compile one field at a time when the stored
+    form is from an older version or the source fields changed since saving."""
+    compiled = template.get("compiled")
+    if (compiled and compiled.get("version") == COMPILED_VERSION
+            and compiled["source"].get(section) == section_fingerprint(template[section])):
+        yield from compiled[section]
+    else:
         for item in template[section]:
-            value = resolve_json_path(user_json or {}, item["map"]) or item["default"]
-            table_data.append([item["key"], str(value)])
+            yield compile_field(item)
+
+STREAM_LOOKAHEAD = 16
+STREAM_TABLE_ROWS = 50
 
-        t = Table(table_data, colWidths=[200, 250])
+def make_table(table_data, with_header=True):
+    t = Table(table_data, colWidths=[200, 250])
+    if with_header:
         t.setStyle(TableStyle([
             ("BACKGROUND", (0,0), (-1,0), colors.grey),
             ("TEXTCOLOR", (0,0), (-1,0), colors.white),
@@ -61,11 +97,104 @@ def generate_pdf(template, user_json=None):
             ("BACKGROUND", (0,1), (-1,-1), colors.whitesmoke),
             ("ALIGN", (0,0), (-1,-1), "LEFT"),
         ]))
+    else:
+        t.setStyle(TableStyle([
+            ("GRID", (0,0), (-1,-1), 1, colors.black),
+            ("BACKGROUND", (0,0), (-1,-1), colors.whitesmoke),
+            ("ALIGN", (0,0), (-1,-1), "LEFT"),
+        ]))
+    return t
 
-        story.append(t)
-        story.append(Spacer(1, 14))
+def iter_story(template, user_json=None, chunk_rows=None):
+    """Yield the PDF flowables. With chunk_rows, each section table is emitted
+    as consecutive tables of at most that many rows instead of one big table."""
+    styles = getSampleStyleSheet()
 
-    doc.build(story)
+    yield Paragraph(f"<b>{template['name']}</b>", styles["Heading1"])
+    yield Spacer(1, 10)
+
+    for section in ["Header", "Body", "Footer"]:
+        yield Paragraph(f"<b>{section}</b>", styles["Heading3"])
+        yield Spacer(1, 6)
+
+        table_data = [["Key", "Value"]]
+        with_header = True
+
+        for item in iter_fields(template, section):
+            value = resolve_json_path(user_json or {}, item["path"]) or item["default"]
+            table_data.append([item["key"], str(value)])
+
+            if chunk_rows and len(table_data) >= chunk_rows:
+                yield make_table(table_data, with_header)
+                table_data, with_header = [], False
+
+        if table_data:
+            yield make_table(table_data, with_header)
+        yield Spacer(1, 14)
+
+def build_streaming(doc, flowables):
+    """Lay out flowables pulled from an iterator, keeping only a small window
+    of the story alive. Mirrors SimpleDocTemplate.build / BaseDocTemplate.build
+    through reportlab's private _startBuild / handle_flowable / _endBuild API
+    (checked against reportlab 5.0.1). Finished pages stay in memory as
+    compressed page streams until save, so memory still grows slowly with
+    page count."""
+    doc._calc()
+    frame = Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height, id="normal")
+    doc.addPageTemplates([
+        PageTemplate(id="First", frames=frame, pagesize=doc.pagesize),
+        PageTemplate(id="Later", frames=frame, pagesize=doc.pagesize)
+    ])
+    doc._startBuild()
+    canv = doc.canv
+
+    try:
+        canv._doctemplate = doc
+        # keep a few flowables queued so keepWithNext / split parts still work
+        window = []
+        for flowable in flowables:
+            window.append(flowable)
+            while len(window) > STREAM_LOOKAHEAD:
+                doc.clean_hanging()
+                doc.handle_flowable(window)
+        while window:
+            doc.clean_hanging()
+            doc.handle_flowable(window)
+    finally:
+        del canv._doctemplate
+
+    doc._endBuild()
+
+@st.cache_resource
+def memory_trace_lock():
+    return threading.Lock()
+
+def traced_generate_pdf(*args, **kwargs):
+    """Run generate_pdf under tracemalloc and return (filename, peak MB of
+    Python memory allocated during the call). tracemalloc is process-wide, so
+    measured generations are serialized; unmeasured sessions running at the
+    same time are still counted."""
+    with memory_trace_lock():
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        try:
+            filename = generate_pdf(*args, **kwargs)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            if started:
+                tracemalloc.stop()
+    return filename, peak / (1024 * 1024)
+
+def generate_pdf(template, user_json=None, stream=False):
+    file = "generated_table.pdf"
+    doc = SimpleDocTemplate(file, pagesize=A4)
+
+    if stream:
+        build_streaming(doc, iter_story(template, user_json, chunk_rows=STREAM_TABLE_ROWS))
+    else:
+        doc.build(list(iter_story(template, user_json)))
     return file
 
 # UI
@@ -103,14 +232,22 @@ if menu == "Create Template":
             f["default"] = st.text_input(f"Footer Default {i}", f["default"])
 
         if st.button("Save Template"):
-            templates[name] = {
+            template = {
                 "name": name,
                 "Header": st.session_state.get("h", []),
                 "Body": st.session_state.get("b", []),
                 "Footer": st.session_state.get("f", [])
             }
-            save_templates(templates)
-            st.success("Saved!")
+            compiled, errors, warnings = compile_template(template, DUMMY)
+            if errors:
+                st.error("Not saved:\n\n" + "\n\n".join(errors))
+            else:
+                template["compiled"] = compiled
+                templates[name] = template
+                save_templates(templates)
+                st.success("Saved!")
+                if warnings:
+                    st.warning("Saved, but some mappings were not found in the sample data:\n\n" + "\n\n".join(warnings))
 
 if menu == "Preview & Generate PDF":
     st.header("Generate PDF")
@@ -119,19 +256,21 @@ if menu == "Preview & Generate PDF":
         tname = st.selectbox("Select Template", list(templates.keys()))
         template = templates[tname]
 
-        dummy = {
-            "user": {"name":"Amit","payDetail":{"total_salary_amount":"80,000"}},
-            "bill": {"bill_no":"BILL-1002","amount":"15,000 INR","date":"01-01-2025"}
-        }
-
-        user_json = dummy
+        user_json = DUMMY
 
         if "salary" in tname.lower():
             user = st.selectbox("User", ["Amit","Ravi","Priya"])
-            user_json = dummy
+            user_json = DUMMY
+
+        stream = st.checkbox("Streaming mode (lower memory for very long documents)")
+        measure = st.checkbox("Measure peak memory of this generation (slower)")
 
         if st.button("Generate PDF"):
-            file = generate_pdf(template, user_json)
+            if measure:
+                file, peak = traced_generate_pdf(template, user_json, stream=stream)
+                st.caption(f"Peak Python memory during generation: {peak:.1f} MB")
+            else:
+                file = generate_pdf(template, user_json, stream=stream)
             with open(file, "rb") as f:
                 st.download_button("Download PDF", f, file_name="table_format.pdf")
 
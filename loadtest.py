@@ -0,0 +1,421 @@
+"""Concurrent-session load test for the PDF generation path.
+
+Drives app.py / app1.py / app2.py / main.py through Streamlit's AppTest with
+N simulated sessions clicking "Generate PDF" at the same moment, and reports
+latency percentiles, throughput, error rate and corrupted outputs as the
+concurrency ramps up. AppTest is not thread-safe (it swaps process-global
+runtime and secrets state), so every session runs in its own process; they
+share the working directory, which is where the apps write their PDFs.
+
+    python loadtest.py --app app1.py --levels 1 2 4 8 16 --rounds 3
+
+Every session gets its own template, so a PDF that does not match the
+single-session baseline for that template means another session's output
+leaked into (or truncated) the file that was served.
+"""
+import os
+
+# Deterministic PDFs (no timestamp / random ID) so outputs can be compared
+# byte-for-byte against the single-session baseline. Must be set before
+# reportlab is imported by the apps.
+os.environ.setdefault("RL_invariant", "1")
+
+import argparse
+import hashlib
+import json
+import math
+import shutil
+import tempfile
+import multiprocessing
+import queue
+import threading
+import time
+from copy import deepcopy
+from unittest import mock
+
+import streamlit as st
+from streamlit import config as st_config
+from streamlit.logger import set_log_level
+from streamlit.testing.v1 import AppTest
+
+APPS = ["app.py", "app1.py", "app2.py", "main.py"]
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+PDF_STATE_KEY = "_loadtest_pdf"
+
+SAMPLE_USER = {
+    "name": "Amit Sharma",
+    "company": {"name": "ABC Pvt Ltd"},
+    "payDetail": {"total_salary_amount": "75,000 INR", "hra": "10,000 INR"}
+}
+
+# --------------------------------
+# Local MongoDB stand-in (main.py)
+# --------------------------------
+class FakeCollection:
+    """Thread-safe in-memory collection covering the calls main.py makes."""
+
+    def __init__(self):
+        self._docs = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _matches(doc, flt):
+        return all(doc.get(k) == v for k, v in (flt or {}).items())
+
+    @staticmethod
+    def _project(doc, projection):
+        doc = deepcopy(doc)
+        if projection and projection.get("_id") == 0:
+            doc.pop("_id", None)
+        return doc
+
+    def find(self, flt=None, projection=None):
+        with self._lock:
+            return [self._project(d, projection) for d in self._docs if self._matches(d, flt)]
+
+    def find_one(self, flt=None, projection=None):
+        found = self.find(flt, projection)
+        return found[0] if found else None
+
+    def insert_one(self, doc):
+        with self._lock:
+            self._docs.append(deepcopy(doc))
+
+    def insert_many(self, docs):
+        with self._lock:
+            self._docs.extend(deepcopy(d) for d in docs)
+
+    def delete_many(self, flt):
+        with self._lock:
+            self._docs = [d for d in self._docs if not self._matches(d, flt)]
+
+    def update_one(self, flt, update, upsert=False):
+        with self._lock:
+            for d in self._docs:
+                if self._matches(d, flt):
+                    d.update(deepcopy(update.get("$set", {})))
+                    return
+            if upsert:
+                doc = dict(flt)
+                doc.update(deepcopy(update.get("$set", {})))
+                self._docs.append(doc)
+
+
+class FakeMongoClient:
+    """Every client in a process shares one store. Each session process seeds
+    its own copy, so only the generated PDF file is shared between sessions."""
+
+    _databases = {}
+    _lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getitem__(self, name):
+        with self._lock:
+            return self._databases.setdefault(name, FakeDatabase())
+
+
+class FakeDatabase:
+    def __init__(self):
+        self._collections = {}
+
+    def __getitem__(self, name):
+        return self._collections.setdefault(name, FakeCollection())
+
+# --------------------------------
+# Fixtures
+# --------------------------------
+def template_name(idx):
+    return f"Salary Load {idx:05d}"
+
+
+def make_template(idx):
+    """Salary template whose footer default is unique to session `idx`."""
+    name = template_name(idx)
+    return {
+        "name": name,
+        "type": "salary",
+        "Header": [
+            {"key": "Company", "map": "user → company → name", "default": "ABC Pvt Ltd", "align": "Center"},
+            {"key": "Employee", "map": "user → name", "default": "N/A", "align": "Left"}
+        ],
+        "Body": [
+            {"key": "Total Salary", "map": "user → payDetail → total_salary_amount", "default": "0", "align": "Left"},
+            {"key": "HRA", "map": "user → payDetail → hra", "default": "0", "align": "Left"}
+        ],
+        "Footer": [
+            {"key": "Session", "map": "loadtest → session", "default": f"LOADTEST{idx:05d}", "align": "Right"}
+        ]
+    }
+
+
+def seed_templates_json(names):
+    """Write the templates the file-based apps read (done once, by the parent)."""
+    with open("templates.json", "w") as f:
+        json.dump({n: make_template(i) for i, n in enumerate(names)}, f, indent=4)
+
+
+def seed_mongo(names):
+    """Fill this process's Mongo stand-in for main.py."""
+    db = FakeMongoClient()["pdf_app"]
+    db["templates"].insert_many(make_template(i) for i in range(len(names)))
+    db["users"].insert_one(SAMPLE_USER)
+
+
+def record_download(label, data, *args, **kwargs):
+    """Stand-in for st.download_button that keeps the served bytes per session."""
+    if hasattr(data, "read"):
+        data = data.read()
+    st.session_state[PDF_STATE_KEY] = data
+    return False
+
+# --------------------------------
+# One Simulated Session
+# --------------------------------
+def quiet_streamlit_logs():
+    """Keep Streamlit's loggers at ERROR in this process. Streamlit logs a
+    bare-mode warning for widgets AppTest touches, and re-applies the
+    configured `logger.level` whenever its config is parsed, so the level is
+    set again after every parse."""
+    set_log_level("error")
+    st_config.on_config_parsed(lambda: set_log_level("error"), force_connect=True)
+
+
+class SetupError(Exception):
+    """The harness could not bring a session up to the Generate PDF screen."""
+
+
+def find_widget(widgets, label):
+    for w in widgets:
+        if w.label == label:
+            return w
+    raise SetupError(f"widget {label!r} not found")
+
+
+def open_session(app, name, timeout):
+    at = AppTest.from_file(os.path.join(REPO_DIR, app), default_timeout=timeout)
+    at.secrets["MONGO_URI"] = "mongodb://loadtest"
+    at.run()
+
+    menu = at.sidebar.radio[0] if len(at.sidebar.radio) else at.sidebar.selectbox[0]
+    menu.set_value("Preview & Generate PDF").run()
+    find_widget(at.selectbox, "Select Template").set_value(name).run()
+    if len(at.exception):
+        raise SetupError(at.exception[0].message)
+    return at, find_widget(at.button, "Generate PDF")
+
+
+def generate(at, button):
+    """Click "Generate PDF"; return (latency_s, pdf_bytes, app_error, timed_out).
+
+    Every failure here belongs to the app under load, including AppTest's
+    rerun timeout, whose latency is the time waited before giving up."""
+    start = time.monotonic()
+    try:
+        button.click().run()
+    except Exception as e:
+        timed_out = isinstance(e, RuntimeError) and "timed out" in str(e)
+        return time.monotonic() - start, None, repr(e), timed_out
+    latency = time.monotonic() - start
+
+    if len(at.exception):
+        return latency, None, at.exception[0].message, False
+    try:
+        return latency, at.session_state[PDF_STATE_KEY], None, False
+    except KeyError:
+        return latency, None, "no PDF was served", False
+
+
+def check_pdf(pdf):
+    """Return None for a structurally complete PDF, otherwise a short reason."""
+    if not pdf.startswith(b"%PDF-") or b"%%EOF" not in pdf[-32:]:
+        return "truncated or malformed"
+    return None
+
+
+def session_process(app, names, idx, barrier, results, timeout):
+    """One simulated user. Puts a single result dict on `results`.
+
+    Timestamps use time.monotonic(), which is a system-wide clock on the
+    platforms Streamlit runs on, so the parent can compare them."""
+    quiet_streamlit_logs()
+    result = {"idx": idx, "setup_error": None, "app_error": None, "timed_out": False}
+
+    with mock.patch("pymongo.MongoClient", FakeMongoClient), \
+         mock.patch.object(st, "download_button", record_download):
+        # only failures before the barrier are the harness's fault
+        try:
+            if app == "main.py":
+                seed_mongo(names)
+            at, button = open_session(app, names[idx], timeout)
+            barrier.wait()
+        except Exception as e:
+            barrier.abort()
+            result["setup_error"] = str(e) if isinstance(e, SetupError) else repr(e)
+            results.put(result)
+            return
+
+        result["released"] = time.monotonic()
+        latency, pdf, app_error, timed_out = generate(at, button)
+        result["finished"] = time.monotonic()
+        result["latency"] = latency
+        result["app_error"] = app_error
+        result["timed_out"] = timed_out
+        if pdf is not None:
+            result["corruption"] = check_pdf(pdf)
+            result["digest"] = hashlib.sha256(pdf).hexdigest()
+    results.put(result)
+
+# --------------------------------
+# Ramp
+# --------------------------------
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def run_round(app, names, indexes, timeout):
+    """Start one process per template index, release them together, and
+    return their result dicts."""
+    barrier = multiprocessing.Barrier(len(indexes), timeout=timeout * 4)
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=session_process,
+                                     args=(app, names, idx, barrier, results, timeout))
+             for idx in indexes]
+    for p in procs:
+        p.start()
+
+    collected = []
+    for idx in indexes:
+        try:
+            collected.append(results.get(timeout=timeout * 8))
+        except queue.Empty:
+            break
+    for p in procs:
+        p.join(timeout)
+        if p.is_alive():
+            p.terminate()
+
+    seen = {r["idx"] for r in collected}
+    for idx in indexes:
+        if idx not in seen:
+            collected.append({"idx": idx, "setup_error": "session process died or hung",
+                              "app_error": None, "timed_out": False})
+    return collected
+
+
+def baseline_digests(app, names, timeout):
+    """Render every template once, alone, to get the expected output."""
+    digests = []
+    for idx, name in enumerate(names):
+        r = run_round(app, names, [idx], timeout)[0]
+        error = r["setup_error"] or r["app_error"] or r.get("corruption")
+        if error or "digest" not in r:
+            raise RuntimeError(f"baseline render of {name!r} failed: {error}")
+        digests.append(r["digest"])
+    return digests
+
+
+def run_level(app, names, digests, concurrency, rounds, timeout):
+    latencies, setup_errors, app_errors, timeouts, corrupt = [], [], [], [], []
+    wall, served = 0.0, 0
+
+    for _ in range(rounds):
+        results = run_round(app, names, list(range(concurrency)), timeout)
+
+        # throughput window: barrier release to the last Generate PDF return
+        # (timed-out clicks included), counting only sessions that got a PDF
+        timed = [r for r in results if "finished" in r]
+        if timed:
+            wall += max(r["finished"] for r in timed) - min(r["released"] for r in timed)
+            served += sum(1 for r in timed if "digest" in r)
+
+        for r in results:
+            if r["setup_error"]:
+                setup_errors.append(r["setup_error"])
+                continue
+            latencies.append(r["latency"])
+            if r["timed_out"]:
+                timeouts.append(r["app_error"])
+            elif r["app_error"]:
+                app_errors.append(r["app_error"])
+            elif r["corruption"]:
+                corrupt.append(r["corruption"])
+            elif r["digest"] != digests[r["idx"]]:
+                corrupt.append("differs from single-session baseline")
+
+    total = concurrency * rounds
+    measured = total - len(setup_errors)
+    return {
+        "concurrency": concurrency,
+        "sessions": total,
+        "measured": measured,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput": served / wall if wall else float("nan"),
+        "error_rate": len(app_errors) / measured if measured else float("nan"),
+        "timeout_rate": len(timeouts) / measured if measured else float("nan"),
+        "corrupt_rate": len(corrupt) / measured if measured else float("nan"),
+        "setup_failures": len(setup_errors),
+        "errors": sorted(set(app_errors)),
+        "timeouts": sorted(set(timeouts)),
+        "corruptions": sorted(set(corrupt)),
+        "setup_errors": sorted(set(setup_errors))
+    }
+
+
+def print_report(app, rows):
+    print(f"\nLoad test: {app}")
+    print(f"{'conc':>5} {'sessions':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'sess/s':>8} {'errors':>7} {'timeout':>8} {'corrupt':>8} {'setup fail':>10}")
+    for r in rows:
+        print(f"{r['concurrency']:>5} {r['sessions']:>8} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+              f"{r['p99_ms']:>9.1f} {r['throughput']:>8.2f} {r['error_rate']:>7.1%} {r['timeout_rate']:>8.1%} "
+              f"{r['corrupt_rate']:>8.1%} {r['setup_failures']:>10}")
+        for msg in r["errors"] + r["timeouts"] + r["corruptions"]:
+            print(f"{'':>5}   ! {msg}")
+        for msg in r["setup_errors"]:
+            print(f"{'':>5}   ? harness: {msg}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", choices=APPS, default="app1.py")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16],
+                        help="concurrent sessions per step of the ramp")
+    parser.add_argument("--rounds", type=int, default=3,
+                        help="bursts per concurrency level")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="per-rerun AppTest timeout in seconds")
+    parser.add_argument("--json", dest="json_out", help="also write results to this file")
+    args = parser.parse_args()
+
+    # Run inside a scratch directory so templates.json and the generated PDFs
+    # never touch the working tree. Session processes inherit this cwd.
+    workdir = tempfile.mkdtemp(prefix="pdf_loadtest_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        names = [template_name(i) for i in range(max(args.levels))]
+        if args.app != "main.py":
+            seed_templates_json(names)
+        digests = baseline_digests(args.app, names, args.timeout)
+        rows = [run_level(args.app, names, digests, c, args.rounds, args.timeout)
+                for c in args.levels]
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(args.app, rows)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump({"app": args.app, "levels": rows}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
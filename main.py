@@ -1,4 +1,6 @@
 import streamlit as st
+import hashlib
+import json
 from pymongo import MongoClient
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -23,8 +25,8 @@ bill_col = db["bills"]
 # --------------------------------
 def resolve_json_path(data, path):
     try:
-        for p in path.split("→"):
-            data = data[p.strip()]
+        for p in path:
+            data = data[p]
         return data
     except:
         return None
@@ -32,6 +34,67 @@ def resolve_json_path(data, path):
 def align_enum(a):
     return {"Left": TA_LEFT, "Center": TA_CENTER, "Right": TA_RIGHT}[a]
 
+# --------------------------------
+# Template Compilation
+# --------------------------------
+COMPILED_VERSION = 2
+ALIGNMENTS = ["Left", "Center", "Right"]
+
+def section_fingerprint(fields):
+    """sha1 of a section's source fields, stored next to the compiled form so
+    hand-edited or externally updated templates are recompiled"""
+    h = hashlib.sha1()
+    for item in fields:
+        h.update(json.dumps(item, sort_keys=True).encode())
+    return h.hexdigest()
+
+def compile_template(template, sample=None):
+    """Validate fields and precompute paths/alignments. Returns (compiled, errors, warnings).
+    Paths missing from the sample record are warnings only (the default is used)."""
+    compiled = {"version": COMPILED_VERSION, "source": {}}
+    errors = []
+    warnings = []
+
+    for section in ["Header", "Body", "Footer"]:
+        fields = []
+        for i, f in enumerate(template[section]):
+            path = [p.strip() for p in f["map"].split("→")]
+            align = f.get("align", "Left")
+
+            if align not in ALIGNMENTS:
+                errors.append(f"{section} field {i+1}: unknown alignment '{align}'")
+                align = "Left"
+            if f["map"].strip() and not all(path):
+                errors.append(f"{section} field {i+1}: malformed mapping '{f['map']}'")
+            elif sample is not None and f["map"].strip() and resolve_json_path(sample, path) is None:
+                warnings.append(f"{section} field {i+1}: '{f['map']}' not in sample data, default '{f['default']}' will be used")
+
+            fields.append({
+                "key": f["key"],
+                "path": path,
+                "default": f["default"],
+                "align": align_enum(align)
+            })
+        compiled[section] = fields
+        compiled["source"][section] = section_fingerprint(template[section])
+
+    return compiled, errors, warnings
+
+def is_current(compiled, template):
+    """True if a stored compiled form matches this version and the source fields"""
+    return (
+        bool(compiled)
+        and compiled.get("version") == COMPILED_VERSION
+        and all(compiled["source"].get(section) == section_fingerprint(template[section])
+                for section in ["Header", "Body", "Footer"])
+    )
+
+def get_compiled(template):
+    compiled = template.get("compiled")
+    if not is_current(compiled, template):
+        compiled, _, _ = compile_template(template)
+    return compiled
+
 def load_templates():
     return list(template_col.find({}, {"_id": 0}))
 
@@ -53,6 +116,8 @@ def generate_pdf(template, data):
 
     story.append(Paragraph(f"<b>{template['name']}</b>", title_style))
 
+    compiled = get_compiled(template)
+
     for section in ["Header", "Body", "Footer"]:
         story.append(Paragraph(
             f"<b>-------------------- {section.upper()} --------------------</b>",
@@ -60,14 +125,14 @@ def generate_pdf(template, data):
         ))
         story.append(Spacer(1, 10))
 
-        for f in template[section]:
-            value = resolve_json_path(data, f["map"])
+        for f in compiled[section]:
+            value = resolve_json_path(data, f["path"])
             if value is None:
                 value = f["default"]
 
             pstyle = ParagraphStyle(
                 "field",
-                alignment=align_enum(f["align"]),
+                alignment=f["align"],
                 fontSize=12
             )
 
@@ -117,18 +182,35 @@ if menu == "Create Template":
                 )
 
         if st.button("Save Template"):
-            template_col.update_one(
-                {"name": template_name},
-                {"$set": {
-                    "name": template_name,
-                    "type": template_type,
-                    "Header": st.session_state["Header_fields"],
-                    "Body": st.session_state["Body_fields"],
-                    "Footer": st.session_state["Footer_fields"]
-                }},
-                upsert=True
-            )
-            st.success("Template saved to MongoDB")
+            template = {
+                "name": template_name,
+                "type": template_type,
+                "Header": st.session_state["Header_fields"],
+                "Body": st.session_state["Body_fields"],
+                "Footer": st.session_state["Footer_fields"]
+            }
+
+            sample_col = user_col if template_type == "salary" else bill_col
+            sample = sample_col.find_one({}, {"_id": 0})
+            sample_desc = f"the first `{sample_col.name}` record"
+            if sample is None:
+                st.warning(f"No {template_type} data in database, mapping paths not checked")
+            elif sample.get("name") or sample.get("number"):
+                sample_desc += f" ({sample.get('name') or sample.get('number')})"
+
+            compiled, errors, warnings = compile_template(template, sample)
+            if errors:
+                st.error("Template not saved:\n\n" + "\n\n".join(errors))
+            else:
+                template["compiled"] = compiled
+                template_col.update_one(
+                    {"name": template_name},
+                    {"$set": template},
+                    upsert=True
+                )
+                st.success("Template saved to MongoDB")
+                if warnings:
+                    st.warning(f"Saved, but some mappings were not found in {sample_desc}:\n\n" + "\n\n".join(warnings))
 
 # --------------------------------
 # PDF Preview & Generate Screen